@@ -1,19 +1,41 @@
 import discord
 from discord.ext import tasks
 import asyncio
+import bisect
+import hashlib
+import heapq
+import itertools
+import json
+import logging
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime, timezone, timedelta
 import os
+import sys
+from typing import NamedTuple
 from dotenv import load_dotenv
 
+try:
+    if sys.platform == "win32":
+        import winloop as uvloop
+    else:
+        import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
 load_dotenv()
 
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger("ae_notifier")
+
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 GUILD_ID = int(os.getenv("GUILD_ID"))
 CHANNEL_ID = int(os.getenv("CHANNEL_ID"))
 NOTIFIER_ROLE_ID = int(os.getenv("NOTIFIER_ROLE_ID"))
 
+MESSAGE_ID_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "message_id.txt")
+
 EVENT_SCHEDULE = {
     "Easy Dungeon":      "0 * * * *",
     "Medium Dungeon":    "10 * * * *",
@@ -24,196 +46,286 @@ EVENT_SCHEDULE = {
     "Nightmare Dungeon": "50 * * * *",
 }
 
-intents = discord.Intents.default()
+JOIN_WINDOW_SECONDS = 120
+
+class Event(NamedTuple):
+    name: str
+    minute: int
+
+# Every schedule is hourly with a fixed minute, so the whole schedule fits on a
+# 60-minute wheel. Events are kept sorted by start minute, alongside their
+# start offsets in seconds past the hour for bisecting.
+EVENTS = tuple(sorted(
+    (Event(name, int(schedule.split()[0])) for name, schedule in EVENT_SCHEDULE.items()),
+    key=lambda event: event.minute
+))
+EVENT_SECONDS_IN_HOUR = [event.minute * 60 for event in EVENTS]
+
+MINUTE_TO_EVENTS = {}
+for _event in EVENTS:
+    MINUTE_TO_EVENTS.setdefault(_event.minute, []).append(_event.name)
+
+# A single job fires on every minute that has at least one event starting.
+PING_TRIGGER = CronTrigger(
+    minute=",".join(str(minute) for minute in MINUTE_TO_EVENTS),
+    timezone=timezone.utc
+)
+
+intents = discord.Intents.none()
 intents.guilds = True
-intents.messages = True
-intents.message_content = True
 
 client = discord.Client(intents=intents)
 scheduler = AsyncIOScheduler(timezone=timezone.utc)
 
 persistent_message = None
+last_embed_hash = None
 active_ping_messages = {}
+expiry_heap = []
+_background_tasks = set()
 
-def get_next_run_time(cron_str):
-    """Calculates the next scheduled run time from a cron string."""
-    trigger = CronTrigger.from_crontab(cron_str, timezone=timezone.utc)
-    now = datetime.now(timezone.utc)
-    return trigger.get_next_fire_time(None, now)
+# The schedule always renders one field per event, so a single embed is built
+# up front and its fields are overwritten in place on every tick.
+schedule_embed = discord.Embed(
+    title="🏰 Dungeon & Raid Schedule",
+    description="Live countdowns for hourly dungeons and raids",
+    color=discord.Color.dark_purple()
+)
+for _ in EVENTS:
+    schedule_embed.add_field(name="\u200b", value="\u200b", inline=False)
+schedule_embed.set_footer(text="🤖 Auto-updating every 10 seconds • Join during the green active window!")
 
-def get_previous_run_time(cron_str):
-    """Calculates the most recent run time from a cron string."""
-    trigger = CronTrigger.from_crontab(cron_str, timezone=timezone.utc)
-    now = datetime.now(timezone.utc)
-    
-    for minutes_back in range(1, 121):
-        check_time = now - timedelta(minutes=minutes_back)
-        next_fire = trigger.get_next_fire_time(None, check_time)
-        
-        if next_fire and next_fire <= now and (now - next_fire).total_seconds() <= 7200:
-            return next_fire
-    
+def get_retry_after(error):
+    """Returns the delay Discord asked for if the error is a rate limit, otherwise None."""
+    if isinstance(error, discord.errors.RateLimited):
+        return error.retry_after
+    if isinstance(error, discord.errors.HTTPException) and error.status == 429:
+        return float(error.response.headers.get("Retry-After", 1))
     return None
 
-async def send_ping(channel, role_id, event_name):
+async def send_ping(channel, role_id, event_name, retry=True):
     """Sends a notification ping and stores it for later deletion."""
     role_to_ping = f"<@&{role_id}>"
     notification_message = f"{role_to_ping} **{event_name}** has started! Join now!"
     
     try:
         sent_message = await channel.send(notification_message)
-        print(f"Sent ping for {event_name}.")
+        logger.info("Sent ping for %s.", event_name)
         
-        active_ping_messages[event_name] = {
-            'message': sent_message,
-            'delete_time': datetime.now(timezone.utc) + timedelta(minutes=2)
-        }
+        active_ping_messages[event_name] = sent_message
+        delete_time = datetime.now(timezone.utc) + timedelta(seconds=JOIN_WINDOW_SECONDS)
+        heapq.heappush(expiry_heap, (delete_time, event_name))
         
     except discord.errors.Forbidden:
-        print(f"Error: Bot lacks permissions to send messages in channel {channel.id}.")
+        logger.error("Bot lacks permissions to send messages in channel %s.", channel.id)
+    except (discord.errors.HTTPException, discord.errors.RateLimited) as e:
+        retry_after = get_retry_after(e)
+        if retry_after is None or not retry:
+            logger.error("An error occurred during ping: %s", e)
+            return
+
+        logger.warning("Rate limited while pinging %s. Retrying in %.2fs...", event_name, retry_after)
+        await asyncio.sleep(retry_after)
+        await send_ping(channel, role_id, event_name, retry=False)
     except Exception as e:
-        print(f"An error occurred during ping: {e}")
+        logger.error("An error occurred during ping: %s", e)
+
+async def send_due_pings(channel, role_id):
+    """Sends a ping for every event starting at the current minute."""
+    minute = datetime.now(timezone.utc).minute
+    for event_name in MINUTE_TO_EVENTS.get(minute, ()):
+        await send_ping(channel, role_id, event_name)
 
 async def cleanup_ping_messages():
     """Clean up expired ping messages."""
     now = datetime.now(timezone.utc)
-    messages_to_remove = []
-    
-    for event_name, msg_data in active_ping_messages.items():
-        if now >= msg_data['delete_time']:
-            try:
-                await msg_data['message'].delete()
-                print(f"Deleted ping message for {event_name}.")
-                messages_to_remove.append(event_name)
-            except discord.errors.NotFound:
-                messages_to_remove.append(event_name)
-            except Exception as e:
-                print(f"Error deleting ping message for {event_name}: {e}")
-                messages_to_remove.append(event_name)
-    
-    for event_name in messages_to_remove:
-        del active_ping_messages[event_name]
+    expired = []
+
+    while expiry_heap and expiry_heap[0][0] <= now:
+        _, event_name = heapq.heappop(expiry_heap)
+        message = active_ping_messages.pop(event_name, None)
+        if message is not None:
+            expired.append((event_name, message))
+
+    if not expired:
+        return
+
+    results = await asyncio.gather(
+        *(message.delete() for _, message in expired),
+        return_exceptions=True
+    )
+
+    for (event_name, message), result in zip(expired, results):
+        if result is None:
+            logger.info("Deleted ping message for %s.", event_name)
+            continue
+        if isinstance(result, discord.errors.NotFound):
+            continue
+
+        retry_after = get_retry_after(result)
+        if retry_after is not None:
+            # Requeue the deletion for once the rate limit has passed.
+            active_ping_messages[event_name] = message
+            heapq.heappush(expiry_heap, (now + timedelta(seconds=retry_after), event_name))
+        else:
+            logger.error("Error deleting ping message for %s: %s", event_name, result)
+
+def _format_seconds(seconds):
+    """Formats a positive number of seconds under an hour as minutes and seconds."""
+    minutes, secs = divmod(seconds, 60)
+    return f"{minutes}m {secs}s" if minutes else f"{secs}s"
+
+# Every join-window countdown is served straight from this table.
+_COUNTDOWNS = tuple(_format_seconds(seconds) for seconds in range(JOIN_WINDOW_SECONDS + 1))
 
 def format_countdown(seconds):
-    """Format seconds into a readable countdown format."""
+    """Format whole seconds (always under an hour) into a readable countdown format."""
     if seconds <= 0:
         return "0s"
-    
-    if seconds >= 3600:
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        return f"{hours}h {minutes}m {secs}s"
-    elif seconds >= 60:
-        minutes = int(seconds // 60)
-        secs = int(seconds % 60)
-        return f"{minutes}m {secs}s"
-    else:
-        return f"{int(seconds)}s"
+    if seconds <= JOIN_WINDOW_SECONDS:
+        return _COUNTDOWNS[seconds]
+    return _format_seconds(seconds)
 
 @tasks.loop(seconds=10)
 async def update_embed():
     """Main loop that updates the countdown embed every 10 seconds."""
-    if not persistent_message:
-        return
-
     await cleanup_ping_messages()
 
+    # Never queue a second edit behind one that is still waiting on Discord.
+    if _background_tasks:
+        return
+
     now = datetime.now(timezone.utc)
-    
-    events_info = []
-    for name, schedule in EVENT_SCHEDULE.items():
-        next_run = get_next_run_time(schedule)
-        prev_run = get_previous_run_time(schedule)
-        
-        if next_run:
-            events_info.append({
-                "name": name, 
-                "next_time": next_run,
-                "prev_time": prev_run
-            })
-
-    embed = discord.Embed(
-        title="🏰 Dungeon & Raid Schedule",
-        description="Live countdowns for hourly dungeons and raids",
-        color=discord.Color.dark_purple()
-    )
+    now_ts = int(now.timestamp())
+    now_s = now.minute * 60 + now.second
+    split = bisect.bisect_right(EVENT_SECONDS_IN_HOUR, now_s)
 
     active_events = []
     upcoming_events = []
-    
-    for event in events_info:
-        if event["prev_time"]:
-            time_since_start = (now - event["prev_time"]).total_seconds()
-            if 0 <= time_since_start <= 120:
-                active_events.append({
-                    **event,
-                    "time_remaining": 120 - time_since_start
-                })
-                continue
-        
-        upcoming_events.append(event)
-    
-    active_events.sort(key=lambda x: x["time_remaining"])
-    
-    upcoming_events.sort(key=lambda x: x["next_time"])
 
-    for event in active_events:
-        time_remaining = max(0, event["time_remaining"])
-        countdown = format_countdown(time_remaining)
-        
-        embed.add_field(
-            name=f"🟢 **ACTIVE** - {event['name']}",
+    # Walking the wheel from the first event still to come this hour visits
+    # events in order of their next start time, so neither list needs sorting.
+    for i in itertools.chain(range(split, len(EVENTS)), range(split)):
+        time_since_start = (now_s - EVENT_SECONDS_IN_HOUR[i]) % 3600
+        if time_since_start <= JOIN_WINDOW_SECONDS:
+            active_events.append((EVENTS[i], JOIN_WINDOW_SECONDS - time_since_start))
+            continue
+
+        time_until = 3600 - time_since_start
+        upcoming_events.append((EVENTS[i], now_ts + time_until, time_until))
+
+    embed = schedule_embed
+
+    for i, (event, time_remaining) in enumerate(active_events):
+        countdown = format_countdown(max(0, time_remaining))
+
+        embed.set_field_at(
+            i,
+            name=f"🟢 **ACTIVE** - {event.name}",
             value=f"⏱️ Join window closes in: **{countdown}**\n🚪 **JOIN NOW!**",
             inline=False
         )
 
-    for i, event in enumerate(upcoming_events):
-        time_until = (event["next_time"] - now).total_seconds()
-        
+    for i, (event, next_ts, time_until) in enumerate(upcoming_events):
         if i == 0 and not active_events:
             status = "🟡 **NEXT UP**"
             countdown = format_countdown(time_until)
             value = f"⏰ Starts in: **{countdown}**"
         else:
             status = "🔴 **SCHEDULED**"
-            timestamp = f"<t:{int(event['next_time'].timestamp())}:R>"
+            timestamp = f"<t:{next_ts}:R>"
             value = f"📅 Starts {timestamp}"
 
-        embed.add_field(
-            name=f"{status} - {event['name']}",
+        embed.set_field_at(
+            len(active_events) + i,
+            name=f"{status} - {event.name}",
             value=value,
             inline=False
         )
 
-    embed.set_footer(text="🤖 Auto-updating every 10 seconds • Join during the green active window!")
+    # Skip the edit entirely when nothing visible changed since the last one.
+    embed_dict = embed.to_dict()
+    embed_dict.pop("timestamp", None)
+    embed_hash = hashlib.blake2b(json.dumps(embed_dict, sort_keys=True).encode()).digest()
+    if embed_hash == last_embed_hash:
+        return
+
     embed.timestamp = now
 
+    task = asyncio.create_task(_safe_edit(embed, embed_hash))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def _safe_edit(embed, embed_hash):
+    """Edits the persistent embed message outside of the update loop's tick."""
+    global last_embed_hash
+    if not persistent_message:
+        # The last attempt to acquire the message failed, so try again instead.
+        await setup_embed_message()
+        return
+
     try:
         await persistent_message.edit(embed=embed)
+        last_embed_hash = embed_hash
     except discord.errors.NotFound:
-        print("Embed message was deleted. Attempting to recreate it...")
-        update_embed.stop()
+        logger.warning("Embed message was deleted. Attempting to recreate it...")
         await setup_embed_message()
+    except (discord.errors.HTTPException, discord.errors.RateLimited) as e:
+        retry_after = get_retry_after(e)
+        if retry_after is None:
+            logger.error("Failed to edit embed: %s", e)
+            return
+
+        # Holding the task open makes the update loop skip its ticks until
+        # the rate limit has passed.
+        logger.warning("Rate limited while editing embed. Pausing updates for %.2fs...", retry_after)
+        await asyncio.sleep(retry_after)
     except Exception as e:
-        print(f"Failed to edit embed: {e}")
+        logger.error("Failed to edit embed: %s", e)
+
+def load_message_id():
+    """Reads the persisted ID of the schedule message, if there is one."""
+    try:
+        with open(MESSAGE_ID_FILE) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+def save_message_id(message_id):
+    """Persists the ID of the schedule message so restarts can fetch it directly."""
+    try:
+        with open(MESSAGE_ID_FILE, "w") as f:
+            f.write(str(message_id))
+    except OSError as e:
+        logger.error("Failed to save message ID %s: %s", message_id, e)
 
 async def setup_embed_message():
-    """Finds the bot's old message or sends a new one, then starts the update loop."""
-    global persistent_message
+    """Finds the bot's old message or sends a new one."""
+    global persistent_message, last_embed_hash
+    persistent_message = None
+    last_embed_hash = None
     try:
         channel = client.get_channel(CHANNEL_ID)
         if not channel:
-            print(f"FATAL: Channel with ID {CHANNEL_ID} not found.")
+            logger.critical("Channel with ID %s not found.", CHANNEL_ID)
             return
 
-        async for msg in channel.history(limit=50):
-            if msg.author.id == client.user.id and msg.embeds:
-                if msg.embeds[0].title and "Dungeon & Raid Schedule" in msg.embeds[0].title:
-                    persistent_message = msg
-                    print(f"Found existing message to edit: {msg.id}")
-                    break
-        
+        message_id = load_message_id()
+        if message_id:
+            try:
+                persistent_message = await channel.fetch_message(message_id)
+                logger.info("Fetched saved message to edit: %s", message_id)
+            except discord.errors.NotFound:
+                logger.info("Saved message %s no longer exists. Searching channel history...", message_id)
+
+        if not persistent_message:
+            async for msg in channel.history(limit=50):
+                if msg.author.id == client.user.id and msg.embeds:
+                    if msg.embeds[0].title and "Dungeon & Raid Schedule" in msg.embeds[0].title:
+                        persistent_message = msg
+                        save_message_id(msg.id)
+                        logger.info("Found existing message to edit: %s", msg.id)
+                        break
+
         if not persistent_message:
             embed = discord.Embed(
                 title="🏰 Dungeon & Raid Schedule", 
@@ -221,51 +333,54 @@ async def setup_embed_message():
                 color=discord.Color.dark_purple()
             )
             persistent_message = await channel.send(embed=embed)
-            print(f"Sent new persistent message: {persistent_message.id}")
-
-        if not update_embed.is_running():
-            update_embed.start()
-            print("Started embed update loop.")
+            save_message_id(persistent_message.id)
+            logger.info("Sent new persistent message: %s", persistent_message.id)
 
     except discord.errors.Forbidden:
-        print(f"FATAL: Bot lacks permissions to read history or send messages in channel {CHANNEL_ID}.")
+        logger.critical("Bot lacks permissions to read history or send messages in channel %s.", CHANNEL_ID)
     except Exception as e:
-        print(f"An error occurred during embed setup: {e}")
+        logger.error("An error occurred during embed setup: %s", e)
+
+@update_embed.before_loop
+async def before_update_embed():
+    """Waits until the bot is ready and the persistent message is in place."""
+    await client.wait_until_ready()
+    await setup_embed_message()
 
 @client.event
 async def on_ready():
     """This function runs once when the bot logs in and is ready."""
-    print(f'🤖 Logged in as {client.user.name} (ID: {client.user.id})')
-    print('------')
+    logger.info("🤖 Logged in as %s (ID: %s)", client.user.name, client.user.id)
 
     if not client.get_guild(GUILD_ID):
-        print(f"FATAL: Bot is not in the server with ID {GUILD_ID}. Please invite it first.")
+        logger.critical("Bot is not in the server with ID %s. Please invite it first.", GUILD_ID)
         await client.close()
         return
 
-    await setup_embed_message()
+    if not update_embed.is_running():
+        update_embed.start()
+        logger.info("Started embed update loop.")
 
     if not scheduler.running:
         channel = client.get_channel(CHANNEL_ID)
-        for name, schedule in EVENT_SCHEDULE.items():
-            scheduler.add_job(
-                send_ping,
-                CronTrigger.from_crontab(schedule, timezone=timezone.utc),
-                args=[channel, NOTIFIER_ROLE_ID, name],
-                id=f"ping_for_{name}",
-                replace_existing=True
-            )
-        
+        scheduler.add_job(
+            send_due_pings,
+            PING_TRIGGER,
+            args=[channel, NOTIFIER_ROLE_ID],
+            id="ping_due_events",
+            replace_existing=True
+        )
+
         scheduler.start()
-        print("📅 APScheduler started and jobs are scheduled.")
-        print(f"🔔 Monitoring {len(EVENT_SCHEDULE)} events for notifications.")
+        logger.info("📅 APScheduler started and jobs are scheduled.")
+        logger.info("🔔 Monitoring %d events for notifications.", len(EVENTS))
 
 try:
     if not BOT_TOKEN or not GUILD_ID or not CHANNEL_ID or not NOTIFIER_ROLE_ID:
-        print("FATAL: Please fill in all the configuration values in the .env file.")
+        logger.critical("Please fill in all the configuration values in the .env file.")
     else:
-        client.run(BOT_TOKEN)
+        client.run(BOT_TOKEN, log_handler=None)
 except discord.errors.LoginFailure:
-    print("FATAL: The bot token is invalid. Please check your token.")
+    logger.critical("The bot token is invalid. Please check your token.")
 except Exception as e:
-    print(f"An error occurred while starting the bot: {e}")
\ No newline at end of file
+    logger.critical("An error occurred while starting the bot: %s", e)
\ No newline at end of file
@@ -0,0 +1,4 @@
+#!/bin/sh
+# Runs the bot with -OO so docstrings and assertions are stripped at import.
+cd "$(dirname "$0")" || exit 1
+exec "${PYTHON:-python3}" -OO bot.py "$@"